@@ -17,9 +17,17 @@ import webbrowser
 
 import logging
 
+import gzip
+import json
 import os
 from dotenv import load_dotenv
 
+# orjson is optional: it decodes large task pages noticeably faster than the standard json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 #Add .env to your .gitignore file: This prevents the .env file from 
 # being committed to your version control system.
@@ -101,6 +109,139 @@ stream_handler.setFormatter(formatter)
 logger.addHandler(stream_handler)
 
 
+"""
+Optional record/replay cassette for the request layer. Set CLICKUP_CASSETTE_MODE in the
+.env file to 'record' to capture every request/response pair of a run to CLICKUP_CASSETTE_FILE
+(gzipped JSON lines), or to 'replay' to serve those responses offline. In replay mode no
+request is sent to ClickUp: writes (PUT/DELETE) are captured in cassette_writes and logged.
+Leave CLICKUP_CASSETTE_MODE empty to talk to the live API as usual.
+"""
+CASSETTE_MODE = (os.getenv('CLICKUP_CASSETTE_MODE') or '').strip().lower()
+CASSETTE_FILE = os.getenv('CLICKUP_CASSETTE_FILE') or 'clickup_cassette.jsonl.gz'
+
+if CASSETTE_MODE not in ('', 'record', 'replay'):
+    raise ValueError(f"CLICKUP_CASSETTE_MODE must be 'record' or 'replay', not {CASSETTE_MODE!r}")
+
+cassette_file = None  # Record mode: gzip file that each entry is appended to as it is recorded
+cassette_entry_count = 0  # Record mode: number of entries written so far
+cassette_responses = {}  # Replay mode: request key -> list of recorded responses
+cassette_positions = {}  # Replay mode: request key -> index of the next response to serve
+cassette_writes = []  # Replay mode: PUT/DELETE requests that were captured instead of sent
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode when a request has no (remaining) recorded response."""
+
+
+class CassetteResponse:
+    """Minimal stand-in for requests.Response served from a cassette."""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    @property
+    def content(self):
+        return self.text.encode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error (replayed from cassette)", response=self)
+
+
+def get_cassette_key(method, url, params=None, json_data=None):
+    # Headers are deliberately left out so the API key never ends up in the cassette
+    return json.dumps([method, url, params or {}, json_data], sort_keys=True, separators=(',', ':'))
+
+
+def load_cassette(path):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as replay_file:
+            for line in replay_file:
+                entry = json.loads(line)
+                cassette_responses.setdefault(entry['key'], []).append(entry)
+    except (EOFError, json.JSONDecodeError):
+        # A recording that was killed or crashed leaves a truncated file; use what was flushed
+        logger.warning(f"Cassette {path} is truncated. Replaying the entries recorded before the cut.")
+    logger.info(f"Replaying {sum(map(len, cassette_responses.values()))} recorded responses from {path}")
+
+
+def open_cassette(path):
+    global cassette_file
+    cassette_file = gzip.open(path, 'wt', encoding='utf-8')
+    logger.info(f"Recording responses to {path}")
+
+
+def record_cassette_entry(key, response):
+    global cassette_entry_count
+    cassette_file.write(json.dumps({'key': key, 'status_code': response.status_code, 'text': response.text}, separators=(',', ':')) + '\n')
+    # Flush after every entry so a killed or crashed recording still leaves a readable cassette
+    cassette_file.flush()
+    cassette_entry_count += 1
+
+
+def close_cassette(path):
+    cassette_file.close()
+    logger.info(f"Recorded {cassette_entry_count} responses to {path}")
+
+
+def replay_request(method, key):
+    recorded = cassette_responses.get(key, [])
+    url = json.loads(key)[1]
+    if method != 'GET':
+        # Writes are never sent while replaying; keep them for inspection instead
+        cassette_writes.append(json.loads(key))
+        logger.info(f"Captured {method} {url} (replay mode, not sent)")
+
+    # Serve repeated identical requests in recorded order; any request beyond the recording
+    # means the replay has diverged from the recorded run
+    position = cassette_positions.get(key, 0)
+    if position >= len(recorded):
+        if recorded:
+            message = f"{method} {url} was requested {position + 1} times but only recorded {len(recorded)} times"
+        else:
+            message = f"No recorded response in cassette for {method} {url}"
+        logger.warning(f"Cassette miss: {message}")
+        raise CassetteMissError(message)
+    cassette_positions[key] = position + 1
+    entry = recorded[position]
+    return CassetteResponse(entry['status_code'], entry['text'])
+
+
+def api_request(method, url, headers, params=None, json_data=None):
+    """Send a request to ClickUp, recording or replaying it when a cassette mode is set.
+
+    Args:
+        method (str): HTTP method, e.g. 'GET', 'PUT' or 'DELETE'.
+        url (str): The URL to request.
+        headers (dict): The headers to use when making the request.
+        params (dict, optional): Query string parameters. Defaults to None.
+        json_data (dict, optional): JSON body for writes. Defaults to None.
+
+    Returns:
+        requests.Response or CassetteResponse: The response to the request.
+    """
+    key = get_cassette_key(method, url, params, json_data)
+    if CASSETTE_MODE == 'replay':
+        return replay_request(method, key)
+
+    response = requests.request(method, url, headers=headers, params=params, json=json_data)
+    # Rate-limited (429) responses are recorded too: writes are not retried, so replay needs them.
+    # The callers skip their rate-limit waits in replay mode instead.
+    if CASSETTE_MODE == 'record':
+        record_cassette_entry(key, response)
+    return response
+
+
+if CASSETTE_MODE == 'replay':
+    load_cassette(CASSETTE_FILE)
+elif CASSETTE_MODE == 'record':
+    open_cassette(CASSETTE_FILE)
+
+
 def get_space_id(space_url):
     return space_url.split('/')[-1]
 
@@ -114,6 +255,45 @@ def get_tasks_url(list_id):
     return f"{BASE_URL}/list/{list_id}/task"
 
 
+def decode_json(response):
+    # Use orjson when it is installed, otherwise fall back to the standard json module
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def project_task(task):
+    """Keep only the task fields read by process_task, hier_update_list and find_parent_task.
+
+    Args:
+        task (dict): A full task object as returned by the ClickUp API.
+
+    Returns:
+        dict: The task with only the fields the rules use.
+    """
+    task_list = task.get('list') or {}
+    return {
+        'id': task.get('id'),
+        'name': task.get('name'),
+        'status': task.get('status'),
+        'parent': task.get('parent'),
+        'list': {'id': task_list.get('id'), 'name': task_list.get('name')},
+        'custom_fields': [
+            {'name': field.get('name'), 'value': field['value']} if 'value' in field else {'name': field.get('name')}
+            for field in task.get('custom_fields', [])
+        ],
+    }
+
+
+def decode_page(response):
+    # Decode any API response; when it is a page of tasks, drop the fields the rules never read
+    # (assignees, checklists, tags, ...)
+    data = decode_json(response)
+    if isinstance(data, dict) and isinstance(data.get('tasks'), list):
+        data['tasks'] = [project_task(task) for task in data['tasks']]
+    return data
+
+
 def handle_api_request(url, headers, params=None, is_get_tasks=False):
     # sourcery skip: remove-unnecessary-else, swap-if-else-branches
     if params is None:
@@ -126,11 +306,12 @@ def handle_api_request(url, headers, params=None, is_get_tasks=False):
         if is_get_tasks:
             params['page'] = page
 
-        response = requests.get(url, headers=headers, params=params)
+        response = api_request('GET', url, headers, params=params)
 
         if response.status_code == 429:
             logger.info("Rate limit reached. Waiting for 60 seconds before retrying.")
-            time.sleep(60)
+            if CASSETTE_MODE != 'replay':
+                time.sleep(60)
             continue
         elif response.status_code == 500:
             logger.info(f"Internal server error when requesting {url}. Please try again later.")
@@ -138,14 +319,15 @@ def handle_api_request(url, headers, params=None, is_get_tasks=False):
         elif response.status_code != 200:
             raise Exception(f"Request to {url} returned status code {response.status_code}")
 
-        data = response.json()
+        data = decode_page(response)
 
         if is_get_tasks:
             all_data.extend(data.get('tasks', []))
             if 'last_page' not in data or data['last_page']:
                 break
             page += 1
-            time.sleep(0.6)
+            if CASSETTE_MODE != 'replay':
+                time.sleep(0.6)
         else:
             return data
 
@@ -172,7 +354,7 @@ def get_data_from_tasks_url(url, headers, params=None):
 
 def get_a_task_details_from_url(url, headers):
 
-    response = requests.get(url, headers=headers)
+    response = api_request('GET', url, headers)
     response.raise_for_status()  # Raise an exception if the request failed
     return response.json()
 
@@ -186,10 +368,11 @@ def get_parent_task(parent_task_id):
 def delete_list(url, headers, folder_id):
 
     # Fetch the list details
-    response = requests.get(url, headers=headers)
+    response = api_request('GET', url, headers)
     if response.status_code == 429:
         logger.info("Rate limit reached. Waiting for 60 seconds before retrying.")
-        time.sleep(60)  # Wait for 60 seconds before retrying
+        if CASSETTE_MODE != 'replay':
+            time.sleep(60)  # Wait for 60 seconds before retrying
     elif response.status_code != 200:
         logger.info(f"Error fetching the list details: {response.status_code}, {response.text} for listurl ==> {url}")
         return False
@@ -200,7 +383,7 @@ def delete_list(url, headers, folder_id):
         return False
 
     # Delete the list
-    response = requests.delete(url, headers=headers)
+    response = api_request('DELETE', url, headers)
     """Function to delete a list in a folder
 
     Returns:
@@ -208,7 +391,8 @@ def delete_list(url, headers, folder_id):
     """
     if response.status_code == 429:
         logger.info("Rate limit reached. Waiting for 60 seconds before retrying.")
-        time.sleep(60)  # Wait for 60 seconds before retrying
+        if CASSETTE_MODE != 'replay':
+            time.sleep(60)  # Wait for 60 seconds before retrying
     elif response.status_code == 200:    
         logger.info(f"Successfully deleted the list in folder {folder_id}. for listurl ==> {url}")
         return True
@@ -226,7 +410,7 @@ def update_task_on_server(task_id, parent_task, parent_list, headers):
         'list_id': int(parent_list['id'])  # Convert list id to integer
     }
     #logger.info(f"*** Updating task ==> {task_id} with parent ==> {parent_task['id']} aka {parent_task['name']}  in list ==> {parent_list['name']}")
-    update_response = requests.put(update_url, headers=headers, json=update_data)
+    update_response = api_request('PUT', update_url, headers, json_data=update_data)
     return update_response.status_code == 200
 
 
@@ -308,6 +492,8 @@ def process_list(list, headers, lists_in_folder_only, subtask_level):
         else:
             tasks = get_data_from_tasks_url(tasks_url, headers, params)
 
+    except CassetteMissError:
+        raise  # A replay that diverged from its recording must not carry on silently
     except Exception as e:
         #sys.stdout.close()
         #sys.stdout = original_stdout
@@ -464,6 +650,8 @@ def find_parent_task(parent_list_name, parent_task_name, lists, headers, parent_
             params = {"subtasks": "true"}
             try:
                 tasks = get_data_from_tasks_url(tasks_url, headers, params)
+            except CassetteMissError:
+                raise
             except Exception as e:  
                 logger.info(f"KeyError: No tasks found for list ==> {potential_parent_list['id']} and {potential_parent_list['name']}")
                 tasks = []
@@ -508,7 +696,7 @@ def get_a_task_details_from_url(url, headers):
     Returns:
         dict: The JSON response from the request.
     """
-    response = requests.get(url, headers=headers)
+    response = api_request('GET', url, headers)
     response.raise_for_status()  # Raise an exception if the request failed
     return response.json()
 
@@ -558,6 +746,8 @@ def hier_update_list(list, headers):
     params = {"include_closed": "true", "subtasks": "true"}
     try:
         tasks = get_data_from_tasks_url(tasks_url, headers, params)
+    except CassetteMissError:
+        raise
     except Exception as e:
         #sys.stdout.close()
         #sys.stdout = original_stdout
@@ -592,6 +782,8 @@ def hier_update_list(list, headers):
         params = {"include_closed": "false", "subtasks": "true"}
         try:
             tasks = get_data_from_tasks_url(tasks_url, headers, params)
+        except CassetteMissError:
+            raise
         except Exception as e:
             logger.info(f"***Error: Exception occurred while fetching tasks for list ==> {list['id']} and {list['name']}***")
             tasks = []
@@ -653,7 +845,7 @@ def update_task_details(task_id, task_details, headers):
     update_url = f"https://api.clickup.com/api/v2/task/{task_id}"
     
     # Send the update request
-    update_response = requests.put(update_url, headers=headers, json=task_details)
+    update_response = api_request('PUT', update_url, headers, json_data=task_details)
     
     return update_response.status_code == 200
 
@@ -669,9 +861,15 @@ try:
     # Iterate over each Space and make another GET request to retrieve all folders in the space
         process_space(space_url, headers)
         
+except CassetteMissError:
+    raise
 except Exception as e:
     logger.info(f"An error occurred while processing {space_url}: {e}")
     logger.info("Local variables:", locals())
 finally:
     logger.info(f"Finished processing {space_url}")
+    if CASSETTE_MODE == 'record':
+        close_cassette(CASSETTE_FILE)
+    elif CASSETTE_MODE == 'replay':
+        logger.info(f"Replay captured {len(cassette_writes)} writes without sending them")
 